@@ -0,0 +1,50 @@
+"""Бенчмарк пути логина: пропускная способность проверки пароля на ядро.
+
+Запуск: python bench_login.py [секунд] [потоков]
+Параметры KDF берутся из тех же переменных окружения, что и в index.py (SCRYPT_N, SCRYPT_R, SCRYPT_P, HASH_WORKERS).
+"""
+import os
+import sys
+import time
+import threading
+import index
+
+
+def run(seconds, clients):
+    stored = index._hash_password_sync('benchmark-password')
+    done = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        n = 0
+        while time.monotonic() < deadline:
+            try:
+                ok, _ = index.verify_password('benchmark-password', stored)
+            except index.HashPoolBusy:
+                continue
+            assert ok
+            n += 1
+        with lock:
+            done[0] += n
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return done[0] / (time.monotonic() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else index.HASH_WORKERS * 2
+    cores = os.cpu_count() or 1
+    rate = run(seconds, clients)
+    print('scrypt N=%d r=%d p=%d, workers=%d, clients=%d, cores=%d' % (index.SCRYPT_N, index.SCRYPT_R, index.SCRYPT_P, index.HASH_WORKERS, clients, cores))
+    print('login verify: %.1f/s total, %.1f/s per core, %.1f ms per hash' % (rate, rate / min(cores, index.HASH_WORKERS), 1000.0 * min(cores, index.HASH_WORKERS) / rate if rate else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,17 +2,209 @@
 import json
 import os
 import hashlib
+import hmac
+import base64
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+
+SCRYPT_N = int(os.environ.get('SCRYPT_N', '16384'))
+SCRYPT_R = int(os.environ.get('SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('SCRYPT_P', '1'))
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', str(os.cpu_count() or 1)))
+HASH_QUEUE = int(os.environ.get('HASH_QUEUE', str(HASH_WORKERS * 4)))
+HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', '10'))
+
+RATE_IP_CAPACITY = float(os.environ.get('RATE_IP_CAPACITY', '20'))
+RATE_IP_REFILL = float(os.environ.get('RATE_IP_REFILL', '1'))
+RATE_EMAIL_CAPACITY = float(os.environ.get('RATE_EMAIL_CAPACITY', '5'))
+RATE_EMAIL_REFILL = float(os.environ.get('RATE_EMAIL_REFILL', '0.1'))
+# Сколько доверенных прокси стоит перед сервисом; 0 — X-Forwarded-For игнорируется
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='pwhash')
+_hash_slots = threading.BoundedSemaphore(HASH_QUEUE)
+
+_db_pool = None
+_db_in_use = 0
+_db_lock = threading.Lock()
+
+
+def init_db_pool(minconn, maxconn):
+    """Включает общий пул соединений для долгоживущего сервера (server.py)"""
+    global _db_pool
+    _db_pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, os.environ['DATABASE_URL'])
+    return _db_pool
+
+
+def close_db_pool():
+    global _db_pool
+    if _db_pool is not None:
+        _db_pool.closeall()
+        _db_pool = None
+
+
+class DbPoolExhausted(Exception):
+    pass
+
 
 def get_db():
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    global _db_in_use
+    if _db_pool is not None:
+        try:
+            conn = _db_pool.getconn()
+        except psycopg2.pool.PoolError:
+            raise DbPoolExhausted()
+    else:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    with _db_lock:
+        _db_in_use += 1
     conn.autocommit = True
     return conn
 
+
+def release_db(conn):
+    global _db_in_use
+    with _db_lock:
+        _db_in_use -= 1
+    if _db_pool is not None:
+        _db_pool.putconn(conn, close=bool(conn.closed))
+    else:
+        conn.close()
+
+
+def db_stats():
+    """Соединения, выданные запросам сейчас, и размер пула (0, если пул не включён)"""
+    with _db_lock:
+        in_use = _db_in_use
+    return in_use, (_db_pool.maxconn if _db_pool is not None else 0)
+
+class HashPoolBusy(Exception):
+    pass
+
+
+def _scrypt(pw, salt, n, r, p):
+    return hashlib.scrypt(pw.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * p + 1024 * 1024, dklen=32)
+
+
+def _hash_password_sync(pw):
+    salt = os.urandom(16)
+    dk = _scrypt(pw, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return 'scrypt$%d$%d$%d$%s$%s' % (SCRYPT_N, SCRYPT_R, SCRYPT_P, base64.b64encode(salt).decode(), base64.b64encode(dk).decode())
+
+
+def _verify_password_sync(pw, stored):
+    """Возвращает (совпал, нужен_рехеш). Старые sha256-хеши принимаются и помечаются на миграцию"""
+    if stored.startswith('scrypt$'):
+        try:
+            _, n, r, p, salt, dk = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+            salt, dk = base64.b64decode(salt), base64.b64decode(dk)
+        except ValueError:
+            return False, False
+        ok = hmac.compare_digest(_scrypt(pw, salt, n, r, p), dk)
+        return ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    ok = hmac.compare_digest(hashlib.sha256(pw.encode()).hexdigest(), stored)
+    return ok, ok
+
+
+def _run_in_hash_pool(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HashPoolBusy()
+    try:
+        future = _hash_pool.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    # Слот освобождается только когда задача реально завершилась, а не когда запрос перестал её ждать
+    future.add_done_callback(lambda f: _hash_slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise HashPoolBusy()
+
+
 def hash_password(pw):
-    return hashlib.sha256(pw.encode()).hexdigest()
+    return _run_in_hash_pool(_hash_password_sync, pw)
+
+
+def verify_password(pw, stored):
+    return _run_in_hash_pool(_verify_password_sync, pw, stored)
+
+
+class TokenBucket:
+    def __init__(self, capacity, refill_per_sec, max_keys=100000):
+        self.capacity = capacity
+        self.refill = refill_per_sec
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.last_sweep = 0.0
+
+    def _sweep(self, now):
+        # Удаляем только уже полностью восстановившиеся корзины: их потеря ничего не меняет,
+        # а частично израсходованные (в т.ч. заблокированные) сохраняются
+        self.last_sweep = now
+        full = [k for k, (tokens, ts) in self.buckets.items() if tokens + (now - ts) * self.refill >= self.capacity]
+        for k in full:
+            del self.buckets[k]
+
+    def allow(self, key, cost=1.0):
+        now = time.monotonic()
+        with self.lock:
+            if key not in self.buckets and len(self.buckets) >= self.max_keys:
+                if now - self.last_sweep >= 1.0:
+                    self._sweep(now)
+                if len(self.buckets) >= self.max_keys:
+                    # Таблица забита активными корзинами — новые ключи не пускаем, пока они не восстановятся
+                    return False
+            tokens, ts = self.buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - ts) * self.refill)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            return allowed
+
+
+_dummy_hash = None
+
+
+def get_dummy_hash():
+    """Хеш-заглушка для несуществующих email: формат и параметры как у настоящего, KDF не считается"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = 'scrypt$%d$%d$%d$%s$%s' % (SCRYPT_N, SCRYPT_R, SCRYPT_P, base64.b64encode(os.urandom(16)).decode(), base64.b64encode(os.urandom(32)).decode())
+    return _dummy_hash
+
+_ip_limiter = TokenBucket(RATE_IP_CAPACITY, RATE_IP_REFILL)
+_email_limiter = TokenBucket(RATE_EMAIL_CAPACITY, RATE_EMAIL_REFILL)
+
+
+def get_client_ip(event):
+    source_ip = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp', '')
+    if TRUSTED_PROXY_HOPS <= 0:
+        return source_ip
+    headers = event.get('headers') or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for') or ''
+    hops = [h.strip() for h in forwarded.split(',') if h.strip()]
+    # Левые значения пишет клиент; доверяем только адресу, добавленному ближайшим к нам доверенным прокси
+    if len(hops) >= TRUSTED_PROXY_HOPS:
+        return hops[-TRUSTED_PROXY_HOPS]
+    return source_ip
+
+
+def check_auth_rate(event, email):
+    if not _ip_limiter.allow('ip:' + get_client_ip(event)):
+        return False
+    if email and not _email_limiter.allow('email:' + email):
+        return False
+    return True
 
 def json_response(status, body, headers_extra=None):
     h = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization'}
@@ -29,6 +221,15 @@ def get_current_user(event, cur):
     row = cur.fetchone()
     return row
 
+# Все значения ?action=, которые разбирает handler(); server.py использует их как метки метрик
+ROUTED_ACTIONS = ('register', 'login', 'me', 'feed', 'create_post', 'get_post', 'remove_post', 'add_comment',
+    'get_comments', 'toggle_like', 'toggle_repost', 'toggle_follow', 'respond_follow', 'follow_list',
+    'profile', 'update_profile', 'search', 'get_messages', 'send_message', 'get_chats', 'message_action',
+    'notifications', 'read_notifications', 'get_stories', 'create_story', 'report', 'toggle_block',
+    'admin_reports', 'admin_action', 'admin_queue', 'admin_bulk', 'admin_verify', 'request_verification',
+    'upload', 'health')
+
+
 def handler(event, context):
     """Главный API социальной сети Online"""
     if event.get('httpMethod') == 'OPTIONS':
@@ -44,14 +245,17 @@ def handler(event, context):
         except:
             body = {}
 
-    conn = get_db()
+    try:
+        conn = get_db()
+    except DbPoolExhausted:
+        return json_response(503, {'error': 'Сервер перегружен, попробуйте позже'}, {'Retry-After': '1'})
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
         if action == 'register' and method == 'POST':
-            return register(cur, body)
+            return register(event, cur, body)
         elif action == 'login' and method == 'POST':
-            return login(cur, body)
+            return login(event, cur, body)
         elif action == 'me' and method == 'GET':
             return get_me(event, cur)
         elif action == 'feed' and method == 'GET':
@@ -106,6 +310,10 @@ def handler(event, context):
             return admin_get_reports(event, cur, params)
         elif action == 'admin_action' and method == 'POST':
             return admin_action(event, cur, body)
+        elif action == 'admin_queue' and method == 'GET':
+            return admin_get_queue(event, cur, params)
+        elif action == 'admin_bulk' and method == 'POST':
+            return admin_bulk_action(event, cur, body)
         elif action == 'admin_verify' and method == 'POST':
             return admin_verify(event, cur, body)
         elif action == 'request_verification' and method == 'POST':
@@ -116,12 +324,14 @@ def handler(event, context):
             return json_response(200, {'status': 'ok', 'service': 'Online Social Network'})
         else:
             return json_response(404, {'error': 'Not found'})
+    except HashPoolBusy:
+        return json_response(503, {'error': 'Сервер перегружен, попробуйте позже'}, {'Retry-After': '1'})
     finally:
         cur.close()
-        conn.close()
+        release_db(conn)
 
 
-def register(cur, body):
+def register(event, cur, body):
     username = body.get('username', '').strip().lower()
     email = body.get('email', '').strip().lower()
     password = body.get('password', '')
@@ -131,27 +341,39 @@ def register(cur, body):
         return json_response(400, {'error': 'Username минимум 3 символа'})
     if len(password) < 4:
         return json_response(400, {'error': 'Пароль минимум 4 символа'})
+    if not check_auth_rate(event, email):
+        return json_response(429, {'error': 'Слишком много попыток, попробуйте позже'}, {'Retry-After': '10'})
     cur.execute("SELECT id FROM users WHERE username = '%s' OR email = '%s'" % (username.replace("'","''"), email.replace("'","''")))
     if cur.fetchone():
         return json_response(400, {'error': 'Пользователь уже существует'})
     pw_hash = hash_password(password)
-    cur.execute("INSERT INTO users (username, email, password_hash, display_name) VALUES ('%s', '%s', '%s', '%s') RETURNING id" % (username.replace("'","''"), email.replace("'","''"), pw_hash, username.replace("'","''")))
+    cur.execute("INSERT INTO users (username, email, password_hash, display_name) VALUES ('%s', '%s', '%s', '%s') RETURNING id" % (username.replace("'","''"), email.replace("'","''"), pw_hash.replace("'","''"), username.replace("'","''")))
     user_id = cur.fetchone()['id']
     token = str(uuid.uuid4())
     cur.execute("INSERT INTO sessions (user_id, token) VALUES (%d, '%s')" % (user_id, token))
     return json_response(200, {'token': token, 'user': {'id': user_id, 'username': username, 'email': email}})
 
 
-def login(cur, body):
+def login(event, cur, body):
     email = body.get('email', '').strip().lower()
     password = body.get('password', '')
     if not email or not password:
         return json_response(400, {'error': 'Заполните все поля'})
-    pw_hash = hash_password(password)
-    cur.execute("SELECT * FROM users WHERE email = '%s' AND password_hash = '%s'" % (email.replace("'","''"), pw_hash))
+    if not check_auth_rate(event, email):
+        return json_response(429, {'error': 'Слишком много попыток, попробуйте позже'}, {'Retry-After': '10'})
+    cur.execute("SELECT * FROM users WHERE email = '%s'" % email.replace("'","''"))
     user = cur.fetchone()
-    if not user:
+    # Для несуществующего email всё равно считаем хеш, чтобы время ответа не выдавало наличие аккаунта
+    ok, needs_rehash = verify_password(password, user['password_hash'] if user else get_dummy_hash())
+    if not user or not ok:
         return json_response(401, {'error': 'Неверный email или пароль'})
+    if needs_rehash:
+        try:
+            new_hash = hash_password(password)
+        except HashPoolBusy:
+            new_hash = None
+        if new_hash:
+            cur.execute("UPDATE users SET password_hash = '%s' WHERE id = %d" % (new_hash.replace("'","''"), user['id']))
     if user['is_blocked']:
         return json_response(403, {'error': 'Аккаунт заблокирован'})
     token = str(uuid.uuid4())
@@ -629,22 +851,110 @@ def toggle_block(event, cur, body):
         return json_response(200, {'blocked': True})
 
 
+ADMIN_PAGE_SIZE = 50
+ADMIN_BULK_MAX = 1000
+PG_INT_MAX = 2147483647
+ADMIN_BULK_ACTIONS = ('block_users', 'unblock_users', 'remove_posts', 'resolve_reports', 'resolve_targets')
+
+
+def parse_ids(value):
+    """Список id из тела запроса; ValueError, если он слишком длинный или содержит не целые числа"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    if len(value) > ADMIN_BULK_MAX:
+        raise ValueError('Не больше %d id за раз' % ADMIN_BULK_MAX)
+    ids = set()
+    for v in value:
+        text = str(v).strip() if isinstance(v, (int, str)) and not isinstance(v, bool) else ''
+        if not (text.isascii() and text.isdigit()) or not 0 < int(text) <= PG_INT_MAX:
+            raise ValueError('Некорректный id: %s' % v)
+        ids.add(int(text))
+    return sorted(ids)
+
+
+def id_array(ids):
+    return "ARRAY[%s]::int[]" % ','.join(str(int(i)) for i in ids)
+
+
+def admin_page_params(params, prefix=''):
+    page = max(1, int(params.get(prefix + 'page', '1')))
+    limit = min(200, max(1, int(params.get(prefix + 'limit', str(ADMIN_PAGE_SIZE)))))
+    return page, limit, (page - 1) * limit
+
+
 def admin_get_reports(event, cur, params):
     user = get_current_user(event, cur)
     if not user or not user['is_admin']:
         return json_response(403, {'error': 'Нет прав'})
+    section = params.get('section', '')
+    reports_page, reports_limit, reports_offset = admin_page_params(params, 'reports_')
+    verif_page, verif_limit, verif_offset = admin_page_params(params, 'verifications_')
+    result = {}
+    if section in ('', 'reports'):
+        cur.execute("""
+            SELECT r.*, ru.username as reporter_username,
+            tu.username as reported_username
+            FROM reports r
+            LEFT JOIN users ru ON r.reporter_id = ru.id
+            LEFT JOIN users tu ON r.reported_user_id = tu.id
+            WHERE r.status = 'pending' ORDER BY r.created_at DESC, r.id DESC LIMIT %d OFFSET %d
+        """ % (reports_limit, reports_offset))
+        result['reports'] = cur.fetchall()
+        cur.execute("SELECT COUNT(*) as total FROM reports WHERE status = 'pending'")
+        result.update({'reports_page': reports_page, 'reports_limit': reports_limit, 'reports_total': cur.fetchone()['total']})
+    if section in ('', 'verifications'):
+        cur.execute("SELECT v.*, u.username FROM verification_requests v JOIN users u ON v.user_id = u.id WHERE v.status = 'pending' ORDER BY v.created_at DESC, v.id DESC LIMIT %d OFFSET %d" % (verif_limit, verif_offset))
+        result['verifications'] = cur.fetchall()
+        cur.execute("SELECT COUNT(*) as total FROM verification_requests WHERE status = 'pending'")
+        result.update({'verifications_page': verif_page, 'verifications_limit': verif_limit, 'verifications_total': cur.fetchone()['total']})
+    if not result:
+        return json_response(400, {'error': 'Неизвестный раздел'})
+    return json_response(200, result)
+
+
+def admin_get_queue(event, cur, params):
+    user = get_current_user(event, cur)
+    if not user or not user['is_admin']:
+        return json_response(403, {'error': 'Нет прав'})
+    page, limit, offset = admin_page_params(params)
     cur.execute("""
-        SELECT r.*, ru.username as reporter_username,
-        tu.username as reported_username
-        FROM reports r
-        LEFT JOIN users ru ON r.reporter_id = ru.id
-        LEFT JOIN users tu ON r.reported_user_id = tu.id
-        WHERE r.status = 'pending' ORDER BY r.created_at DESC
-    """)
-    reports = cur.fetchall()
-    cur.execute("SELECT v.*, u.username FROM verification_requests v JOIN users u ON v.user_id = u.id WHERE v.status = 'pending' ORDER BY v.created_at DESC")
-    verifications = cur.fetchall()
-    return json_response(200, {'reports': reports, 'verifications': verifications})
+        SELECT g.reported_user_id, g.reported_post_id, g.reports_count, g.report_ids,
+        g.reasons, g.first_reported_at, g.last_reported_at,
+        tu.username as reported_username, tu.is_blocked as reported_user_blocked,
+        p.content as post_content, p.is_removed as post_removed, pu.username as post_author_username
+        FROM (
+            SELECT reported_user_id, reported_post_id, COUNT(*) as reports_count,
+            array_agg(id ORDER BY id) as report_ids,
+            (array_agg(reason ORDER BY created_at DESC))[1:5] as reasons,
+            MIN(created_at) as first_reported_at, MAX(created_at) as last_reported_at
+            FROM reports WHERE status = 'pending'
+            GROUP BY reported_user_id, reported_post_id
+            ORDER BY COUNT(*) DESC, MAX(created_at) DESC, reported_user_id, reported_post_id
+            LIMIT %d OFFSET %d
+        ) g
+        LEFT JOIN users tu ON g.reported_user_id = tu.id
+        LEFT JOIN posts p ON g.reported_post_id = p.id
+        LEFT JOIN users pu ON p.user_id = pu.id
+        ORDER BY g.reports_count DESC, g.last_reported_at DESC, g.reported_user_id, g.reported_post_id
+    """ % (limit, offset))
+    groups = cur.fetchall()
+    cur.execute("SELECT COUNT(*) as targets, COALESCE(SUM(c), 0) as reports FROM (SELECT COUNT(*) as c FROM reports WHERE status = 'pending' GROUP BY reported_user_id, reported_post_id) t")
+    totals = cur.fetchone()
+    return json_response(200, {'groups': groups, 'page': page, 'limit': limit, 'targets_total': totals['targets'], 'reports_total': totals['reports']})
+
+
+def block_users(cur, user_ids):
+    """Блокирует пользователей (кроме админов) и возвращает id тех, кто реально заблокирован"""
+    if not user_ids:
+        return []
+    cur.execute("UPDATE users SET is_blocked = TRUE WHERE id = ANY(%s) AND is_admin = FALSE RETURNING id" % id_array(user_ids))
+    blocked = [r['id'] for r in cur.fetchall()]
+    if blocked:
+        # Разлогиниваем заблокированных; их посты уже отфильтрованы из ленты по u.is_blocked
+        cur.execute("DELETE FROM sessions WHERE user_id = ANY(%s)" % id_array(blocked))
+    return blocked
 
 
 def admin_action(event, cur, body):
@@ -654,7 +964,7 @@ def admin_action(event, cur, body):
     action = body.get('action', '')
     if action == 'block_user':
         target_id = int(body.get('user_id', 0))
-        cur.execute("UPDATE users SET is_blocked = TRUE WHERE id = %d" % target_id)
+        block_users(cur, [target_id])
     elif action == 'unblock_user':
         target_id = int(body.get('user_id', 0))
         cur.execute("UPDATE users SET is_blocked = FALSE WHERE id = %d" % target_id)
@@ -667,6 +977,52 @@ def admin_action(event, cur, body):
     return json_response(200, {'success': True})
 
 
+def admin_bulk_action(event, cur, body):
+    user = get_current_user(event, cur)
+    if not user or not user['is_admin']:
+        return json_response(403, {'error': 'Нет прав'})
+    action = body.get('action', '')
+    if action not in ADMIN_BULK_ACTIONS:
+        return json_response(400, {'error': 'Неизвестное действие'})
+    try:
+        user_ids = parse_ids(body.get('user_ids'))
+        post_ids = parse_ids(body.get('post_ids'))
+        report_ids = parse_ids(body.get('report_ids'))
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    resolve = body.get('resolve', True)
+    affected = 0
+    if action == 'block_users':
+        blocked = block_users(cur, user_ids)
+        affected = len(blocked)
+        if resolve and blocked:
+            cur.execute("UPDATE reports SET status = 'resolved' WHERE status = 'pending' AND reported_user_id = ANY(%s)" % id_array(blocked))
+    elif action == 'unblock_users':
+        if user_ids:
+            cur.execute("UPDATE users SET is_blocked = FALSE WHERE id = ANY(%s)" % id_array(user_ids))
+            affected = cur.rowcount
+    elif action == 'remove_posts':
+        if post_ids:
+            cur.execute("UPDATE posts SET is_removed = TRUE WHERE id = ANY(%s) AND is_removed = FALSE" % id_array(post_ids))
+            affected = cur.rowcount
+            if resolve:
+                cur.execute("UPDATE reports SET status = 'resolved' WHERE status = 'pending' AND reported_post_id = ANY(%s)" % id_array(post_ids))
+    elif action == 'resolve_reports':
+        if report_ids:
+            cur.execute("UPDATE reports SET status = 'resolved' WHERE status = 'pending' AND id = ANY(%s)" % id_array(report_ids))
+            affected = cur.rowcount
+    elif action == 'resolve_targets':
+        conds = []
+        if user_ids:
+            conds.append("(reported_post_id IS NULL AND reported_user_id = ANY(%s))" % id_array(user_ids))
+        if post_ids:
+            conds.append("reported_post_id = ANY(%s)" % id_array(post_ids))
+        if conds:
+            cur.execute("UPDATE reports SET status = 'resolved' WHERE status = 'pending' AND (%s)" % ' OR '.join(conds))
+            affected = cur.rowcount
+    return json_response(200, {'success': True, 'affected': affected})
+
+
 def admin_verify(event, cur, body):
     user = get_current_user(event, cur)
     if not user or not user['is_admin']:
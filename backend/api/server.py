@@ -0,0 +1,237 @@
+"""Самостоятельный сервер для API: WSGI-адаптер над handler(event, context) с пулом потоков.
+
+Запуск: DATABASE_URL=... python server.py [--host 0.0.0.0] [--port 8000] [--workers N] [--db-pool N]
+Каждый HTTP-запрос превращается в event того же вида, что отдаёт облачная функция.
+GET /metrics — метрики в формате Prometheus. Соединения сверх --workers + --backlog получают 503. SIGTERM/SIGINT — плавная остановка.
+"""
+import argparse
+import base64
+import os
+import signal
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+import index
+
+
+# Метки action ограничены маршрутами handler(), иначе каждый произвольный ?action=... заводил бы новую серию метрик
+KNOWN_ACTIONS = frozenset(index.ROUTED_ACTIONS)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.latency_sum = {}
+        self.latency_count = {}
+        self.queue_sum = 0.0
+        self.queue_count = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end(self, action, status, seconds):
+        with self.lock:
+            self.in_flight -= 1
+            key = (action, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency_sum[action] = self.latency_sum.get(action, 0.0) + seconds
+            self.latency_count[action] = self.latency_count.get(action, 0) + 1
+
+    def queued(self, seconds):
+        with self.lock:
+            self.queue_sum += seconds
+            self.queue_count += 1
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def render(self):
+        with self.lock:
+            lines = ['# TYPE api_requests_total counter']
+            for (action, status), n in sorted(self.requests.items()):
+                lines.append('api_requests_total{action="%s",status="%d"} %d' % (action, status, n))
+            lines.append('# TYPE api_request_seconds summary')
+            for action in sorted(self.latency_sum):
+                lines.append('api_request_seconds_sum{action="%s"} %.6f' % (action, self.latency_sum[action]))
+                lines.append('api_request_seconds_count{action="%s"} %d' % (action, self.latency_count[action]))
+            lines.append('# TYPE api_queue_seconds summary')
+            lines.append('api_queue_seconds_sum %.6f' % self.queue_sum)
+            lines.append('api_queue_seconds_count %d' % self.queue_count)
+            lines.append('# TYPE api_connections_rejected_total counter')
+            lines.append('api_connections_rejected_total %d' % self.rejected)
+            lines.append('# TYPE api_requests_in_flight gauge')
+            lines.append('api_requests_in_flight %d' % self.in_flight)
+            lines.append('# TYPE api_uptime_seconds gauge')
+            lines.append('api_uptime_seconds %.1f' % (time.time() - self.started))
+        in_use, size = index.db_stats()
+        lines.append('# TYPE api_db_connections_in_use gauge')
+        lines.append('api_db_connections_in_use %d' % in_use)
+        lines.append('# TYPE api_db_pool_size gauge')
+        lines.append('api_db_pool_size %d' % size)
+        lines.append('# TYPE api_cpu_cores gauge')
+        lines.append('api_cpu_cores %d' % (os.cpu_count() or 1))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class Context:
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.function_name = 'api'
+
+
+def environ_to_event(environ):
+    headers = {}
+    for key, value in environ.items():
+        if key.startswith('HTTP_'):
+            headers[key[5:].replace('_', '-').title()] = value
+    if environ.get('CONTENT_TYPE'):
+        headers['Content-Type'] = environ['CONTENT_TYPE']
+    # Облачный шлюз передаёт Authorization в функцию как X-Authorization
+    if 'Authorization' in headers and 'X-Authorization' not in headers:
+        headers['X-Authorization'] = headers['Authorization']
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    body = environ['wsgi.input'].read(length).decode('utf-8', 'replace') if length else ''
+    return {
+        'httpMethod': environ.get('REQUEST_METHOD', 'GET'),
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(environ.get('QUERY_STRING', ''))),
+        'body': body,
+        'isBase64Encoded': False,
+        'requestContext': {'requestId': str(uuid.uuid4()), 'identity': {'sourceIp': environ.get('REMOTE_ADDR', '')}},
+    }
+
+
+def status_line(code):
+    try:
+        return '%d %s' % (code, HTTPStatus(code).phrase)
+    except ValueError:
+        return '%d Unknown' % code
+
+
+def app(environ, start_response):
+    if environ.get('PATH_INFO') == '/metrics':
+        data = metrics.render().encode()
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4'), ('Content-Length', str(len(data)))])
+        return [data]
+    event = environ_to_event(environ)
+    action = event['queryStringParameters'].get('action', 'health')
+    if action not in KNOWN_ACTIONS:
+        action = 'unknown'
+    metrics.begin()
+    # Время отсчитывается от приёма соединения, чтобы ожидание в очереди попадало в латентность
+    start = environ.get('api.accepted_at') or time.perf_counter()
+    status = 500
+    try:
+        result = index.handler(event, Context(event['requestContext']['requestId']))
+        status = int(result.get('statusCode', 200))
+        body = result.get('body') or ''
+        data = base64.b64decode(body) if result.get('isBase64Encoded') else body.encode()
+        headers = [(k, str(v)) for k, v in (result.get('headers') or {}).items()]
+    except Exception:
+        traceback.print_exc()
+        data = b'{"error": "Internal server error"}'
+        headers = [('Content-Type', 'application/json')]
+    finally:
+        metrics.end(action, status, time.perf_counter() - start)
+    headers.append(('Content-Length', str(len(data))))
+    start_response(status_line(status), headers)
+    return [data]
+
+
+_conn_state = threading.local()
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGIServer, обрабатывающий соединения в ограниченном пуле потоков с ограниченной очередью"""
+
+    def __init__(self, *args, workers=4, backlog=16, **kwargs):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+        self.slots = threading.BoundedSemaphore(workers + backlog)
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            metrics.reject()
+            try:
+                request.sendall(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nRetry-After: 1\r\nConnection: close\r\n\r\n')
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.executor.submit(self._process, request, client_address, time.perf_counter())
+
+    def _process(self, request, client_address, accepted_at):
+        metrics.queued(time.perf_counter() - accepted_at)
+        _conn_state.accepted_at = accepted_at
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.slots.release()
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def get_environ(self):
+        env = super().get_environ()
+        env['api.accepted_at'] = getattr(_conn_state, 'accepted_at', None)
+        return env
+
+    def log_message(self, format, *args):
+        if os.environ.get('ACCESS_LOG'):
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API server')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', str((os.cpu_count() or 1) * 4))))
+    parser.add_argument('--db-pool', type=int, default=int(os.environ.get('DB_POOL', '10')), help='максимум соединений с Postgres; при исчерпании запросы получают 503')
+    parser.add_argument('--backlog', type=int, default=int(os.environ.get('BACKLOG', '64')), help='сколько соединений может ждать свободного потока; остальные получают 503')
+    args = parser.parse_args()
+
+    index.init_db_pool(1, args.db_pool)
+    server = make_server(args.host, args.port, app,
+                         server_class=lambda *a, **kw: PooledWSGIServer(*a, workers=args.workers, backlog=args.backlog, **kw),
+                         handler_class=QuietHandler)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print('Serving on http://%s:%d with %d workers, backlog %d, db pool %d' % (args.host, args.port, args.workers, args.backlog, args.db_pool))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        index.close_db_pool()
+        index._hash_pool.shutdown(wait=True)
+        print('Stopped')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+CREATE INDEX idx_reports_pending_target ON reports(reported_user_id, reported_post_id) WHERE status = 'pending';
+CREATE INDEX idx_reports_pending_created ON reports(created_at) WHERE status = 'pending';
+CREATE INDEX idx_verification_requests_pending ON verification_requests(created_at) WHERE status = 'pending';
+CREATE INDEX idx_sessions_user_id ON sessions(user_id);
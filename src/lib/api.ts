@@ -71,9 +71,14 @@ export const api = {
   report: (reason: string, user_id?: number, post_id?: number) =>
     request("report", "POST", { reason, user_id, post_id }),
   toggleBlock: (user_id: number) => request("toggle_block", "POST", { user_id }),
-  adminReports: () => request("admin_reports", "GET"),
+  adminReports: (params: { section?: "reports" | "verifications"; reports_page?: number; verifications_page?: number } = {}) =>
+    request("admin_reports", "GET", undefined, Object.fromEntries(Object.entries(params).map(([k, v]) => [k, String(v)]))),
   adminAction: (action: string, user_id?: number, post_id?: number, report_id?: number) =>
     request("admin_action", "POST", { action, user_id, post_id, report_id }),
+  adminQueue: (page = 1, limit = 50) =>
+    request("admin_queue", "GET", undefined, { page: String(page), limit: String(limit) }),
+  adminBulk: (action: string, ids: { user_ids?: number[]; post_ids?: number[]; report_ids?: number[] }, resolve = true) =>
+    request("admin_bulk", "POST", { action, ...ids, resolve }),
   adminVerify: (request_id: number, action: string) =>
     request("admin_verify", "POST", { request_id, action }),
   requestVerification: () => request("request_verification", "POST"),
@@ -4,10 +4,10 @@ import { useAuth } from "@/contexts/AuthContext";
 import Icon from "@/components/ui/icon";
 import { Button } from "@/components/ui/button";
 
-interface Report {
-  id: number; reporter_username: string; reported_username: string;
-  reported_post_id: number | null; reason: string; created_at: string;
-  reported_user_id: number | null;
+interface ReportGroup {
+  reported_user_id: number | null; reported_post_id: number | null;
+  reported_username: string | null; post_author_username: string | null;
+  reports_count: number; reasons: string[]; last_reported_at: string;
 }
 
 interface VerifRequest {
@@ -16,15 +16,36 @@ interface VerifRequest {
 
 export default function Admin() {
   const { user } = useAuth();
-  const [reports, setReports] = useState<Report[]>([]);
+  const [groups, setGroups] = useState<ReportGroup[]>([]);
+  const [reportsTotal, setReportsTotal] = useState(0);
+  const [queuePage, setQueuePage] = useState(1);
+  const [queueHasMore, setQueueHasMore] = useState(false);
   const [verifications, setVerifications] = useState<VerifRequest[]>([]);
+  const [verificationsTotal, setVerificationsTotal] = useState(0);
+  const [verifPage, setVerifPage] = useState(1);
   const [loading, setLoading] = useState(true);
   const [tab, setTab] = useState<"reports" | "verifications">("reports");
 
+  const loadQueue = async (page: number) => {
+    const d = await api.adminQueue(page);
+    const next: ReportGroup[] = d.groups || [];
+    setGroups((prev) => (page === 1 ? next : [...prev, ...next]));
+    setReportsTotal(d.reports_total || 0);
+    setQueueHasMore(page * (d.limit || 50) < (d.targets_total || 0));
+    setQueuePage(page);
+  };
+
+  const loadVerifications = async (page: number) => {
+    const d = await api.adminReports({ section: "verifications", verifications_page: page });
+    const next: VerifRequest[] = d.verifications || [];
+    setVerifications((prev) => (page === 1 ? next : [...prev, ...next]));
+    setVerificationsTotal(d.verifications_total || 0);
+    setVerifPage(page);
+  };
+
   useEffect(() => {
     if (!user?.is_admin) return;
-    api.adminReports()
-      .then((d) => { setReports(d.reports || []); setVerifications(d.verifications || []); })
+    Promise.all([loadQueue(1), loadVerifications(1)])
       .catch(() => void 0)
       .finally(() => setLoading(false));
   }, [user]);
@@ -38,12 +59,13 @@ export default function Admin() {
     );
   }
 
-  const handleReport = async (reportId: number, action: string, userId?: number | null, postId?: number | null) => {
+  const handleGroup = async (g: ReportGroup, action: "block" | "remove" | "dismiss") => {
     try {
-      if (action === "block" && userId) await api.adminAction("block_user", userId);
-      if (action === "remove" && postId) await api.adminAction("remove_post", undefined, postId);
-      await api.adminAction("resolve_report", undefined, undefined, reportId);
-      setReports(reports.filter((r) => r.id !== reportId));
+      if (action === "block" && g.reported_user_id) await api.adminBulk("block_users", { user_ids: [g.reported_user_id] });
+      else if (action === "remove" && g.reported_post_id) await api.adminBulk("remove_posts", { post_ids: [g.reported_post_id] });
+      else if (g.reported_post_id) await api.adminBulk("resolve_targets", { post_ids: [g.reported_post_id] });
+      else if (g.reported_user_id) await api.adminBulk("resolve_targets", { user_ids: [g.reported_user_id] });
+      await loadQueue(1);
     } catch { void 0; }
   };
 
@@ -51,6 +73,7 @@ export default function Admin() {
     try {
       await api.adminVerify(requestId, action);
       setVerifications(verifications.filter((v) => v.id !== requestId));
+      setVerificationsTotal((t) => Math.max(0, t - 1));
     } catch { void 0; }
   };
 
@@ -67,46 +90,51 @@ export default function Admin() {
 
       <div className="flex gap-1 bg-secondary rounded-lg p-1 mb-6">
         <button onClick={() => setTab("reports")} className={`flex-1 py-2 rounded-md text-sm font-medium transition-all ${tab === "reports" ? "bg-background shadow-sm" : "text-muted-foreground"}`}>
-          Жалобы ({reports.length})
+          Жалобы ({reportsTotal})
         </button>
         <button onClick={() => setTab("verifications")} className={`flex-1 py-2 rounded-md text-sm font-medium transition-all ${tab === "verifications" ? "bg-background shadow-sm" : "text-muted-foreground"}`}>
-          Верификация ({verifications.length})
+          Верификация ({verificationsTotal})
         </button>
       </div>
 
       {tab === "reports" && (
-        reports.length === 0 ? (
+        groups.length === 0 ? (
           <div className="text-center py-16">
             <Icon name="CheckCircle" size={48} className="text-primary mx-auto mb-3" />
             <p className="text-muted-foreground">Нет жалоб</p>
           </div>
         ) : (
           <div className="space-y-3">
-            {reports.map((r) => (
-              <div key={r.id} className="bg-card border border-border rounded-xl p-4">
+            {groups.map((g) => (
+              <div key={`${g.reported_user_id}-${g.reported_post_id}`} className="bg-card border border-border rounded-xl p-4">
                 <div className="flex items-start justify-between">
                   <div>
-                    <p className="text-sm"><span className="text-muted-foreground">От:</span> {r.reporter_username}</p>
-                    {r.reported_username && <p className="text-sm"><span className="text-muted-foreground">На:</span> {r.reported_username}</p>}
-                    {r.reported_post_id && <p className="text-sm text-muted-foreground">Пост #{r.reported_post_id}</p>}
-                    <p className="text-sm mt-2 bg-destructive/10 text-destructive px-2 py-1 rounded">{r.reason}</p>
+                    {g.reported_username && <p className="text-sm"><span className="text-muted-foreground">На:</span> {g.reported_username}</p>}
+                    {g.reported_post_id && <p className="text-sm text-muted-foreground">Пост #{g.reported_post_id}{g.post_author_username ? ` от ${g.post_author_username}` : ""}</p>}
+                    {g.reasons.map((reason, i) => (
+                      <p key={i} className="text-sm mt-2 bg-destructive/10 text-destructive px-2 py-1 rounded">{reason}</p>
+                    ))}
                   </div>
+                  <span className="text-xs font-medium bg-secondary px-2 py-1 rounded-full">{g.reports_count}</span>
                 </div>
                 <div className="flex gap-2 mt-3">
-                  {r.reported_user_id && (
-                    <Button size="sm" variant="destructive" onClick={() => handleReport(r.id, "block", r.reported_user_id)}>
+                  {g.reported_user_id && (
+                    <Button size="sm" variant="destructive" onClick={() => handleGroup(g, "block")}>
                       <Icon name="Ban" size={12} className="mr-1" /> Заблокировать
                     </Button>
                   )}
-                  {r.reported_post_id && (
-                    <Button size="sm" variant="secondary" onClick={() => handleReport(r.id, "remove", null, r.reported_post_id)}>
+                  {g.reported_post_id && (
+                    <Button size="sm" variant="secondary" onClick={() => handleGroup(g, "remove")}>
                       <Icon name="Trash2" size={12} className="mr-1" /> Удалить пост
                     </Button>
                   )}
-                  <Button size="sm" variant="ghost" onClick={() => handleReport(r.id, "dismiss")}>Отклонить</Button>
+                  <Button size="sm" variant="ghost" onClick={() => handleGroup(g, "dismiss")}>Отклонить</Button>
                 </div>
               </div>
             ))}
+            {queueHasMore && (
+              <Button variant="secondary" className="w-full" onClick={() => loadQueue(queuePage + 1).catch(() => void 0)}>Показать ещё</Button>
+            )}
           </div>
         )
       )}
@@ -133,6 +161,9 @@ export default function Admin() {
                 </div>
               </div>
             ))}
+            {verifications.length < verificationsTotal && (
+              <Button variant="secondary" className="w-full" onClick={() => loadVerifications(verifPage + 1).catch(() => void 0)}>Показать ещё</Button>
+            )}
           </div>
         )
       )}